@@ -1,28 +1,153 @@
 # folder_monitor.py
+import asyncio
+import json
 import os
+import re
+import sys
 import time
 import threading
-from datetime import datetime
-from typing import Any, Dict
+from collections import OrderedDict, defaultdict
+from array import array
+from typing import Any, Dict, List, Optional
 from watchdog.observers import Observer
-from watchdog.observers.polling import PollingObserver
-from watchdog.events import PatternMatchingEventHandler
-from .folder_scanner import _scan_for_images  # Import folder scanner
-from .metadata_extractor import buildMetadata
+from watchdog.observers.polling import PollingObserverVFS
+from watchdog.events import FileSystemEventHandler
+from .folder_scanner import _scan_for_images, format_timestamp, GALLERY_EXTS, IMAGE_EXTS  # Import folder scanner
+from .metadata_extractor import buildMetadata_fast
+from .metadata_cache import get_metadata_cache
 from server import PromptServer
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from .gallery_config import gallery_log
 
-# Module-level cache of file metadata
 FileInfo = Dict[str, Any]
-file_index: Dict[str, FileInfo] = {}
 
+TYPE_IMAGE = 0
+TYPE_MEDIA = 1
 
-def _build_file_info(base_path: str, real_path: str) -> FileInfo:
-    """Build metadata for a single file."""
-    timestamp = os.path.getmtime(real_path)
-    date_str = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
-    rel_dir = os.path.relpath(os.path.dirname(real_path), base_path)
-    filename = os.path.basename(real_path)
+
+class FileIndex:
+    """Index of monitored files stored as parallel arrays keyed by relative path; guarded by self.lock."""
+
+    def __init__(self, base_path: Optional[str] = None):
+        self.base_path = base_path  # Real path the keys are relative to
+        self.lock = threading.RLock()
+        self.paths: List[str] = []
+        self.names: List[str] = []
+        self.subfolder_ids = array("I")
+        self.subfolder_table: List[str] = []  # URL prefixes, e.g. "/static_gallery/sub/"
+        self.subfolder_to_id: Dict[str, int] = {}
+        self.timestamps = array("d")
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+        self.types: List[int] = []
+        self.path_to_idx: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, rel_path):
+        return rel_path in self.path_to_idx
+
+    def add(self, rel_path: str, info: FileInfo) -> int:
+        """Inserts or replaces the row for rel_path and returns its index."""
+        metadata = None if info.get("_meta_pending") else info["metadata"]
+        file_type = TYPE_IMAGE if info["type"] == "image" else TYPE_MEDIA
+        name = info["name"]
+        url_prefix = info["url"][:-len(name)] if name else info["url"]
+        with self.lock:
+            subfolder_id = self.subfolder_to_id.get(url_prefix)
+            if subfolder_id is None:
+                subfolder_id = self.subfolder_to_id[url_prefix] = len(self.subfolder_table)
+                self.subfolder_table.append(url_prefix)
+            idx = self.path_to_idx.get(rel_path)
+            if idx is not None:
+                self.names[idx] = name
+                self.subfolder_ids[idx] = subfolder_id
+                self.timestamps[idx] = info["timestamp"]
+                self.metadata[idx] = metadata
+                self.types[idx] = file_type
+                return idx
+            idx = len(self.paths)
+            self.paths.append(rel_path)
+            self.names.append(name)
+            self.subfolder_ids.append(subfolder_id)
+            self.timestamps.append(info["timestamp"])
+            self.metadata.append(metadata)
+            self.types.append(file_type)
+            self.path_to_idx[rel_path] = idx
+            return idx
+
+    def remove(self, rel_path: str) -> None:
+        with self.lock:
+            idx = self.path_to_idx.pop(rel_path, None)
+            if idx is None:
+                return
+            last = len(self.paths) - 1
+            if idx != last:
+                for column in (self.paths, self.names, self.subfolder_ids, self.timestamps, self.metadata, self.types):
+                    column[idx] = column[last]
+                self.path_to_idx[self.paths[idx]] = idx
+            for column in (self.paths, self.names, self.subfolder_ids, self.timestamps, self.metadata, self.types):
+                column.pop()
+
+    def get_metadata(self, rel_path: str):
+        """Returns (indexed, metadata); metadata is None while still pending."""
+        with self.lock:
+            idx = self.path_to_idx.get(rel_path)
+            if idx is None:
+                return False, None
+            return True, self.metadata[idx]
+
+    def fill_metadata(self, rel_path: str, metadata: Dict[str, Any]) -> None:
+        """Stores extracted metadata if rel_path is still indexed and still pending."""
+        with self.lock:
+            idx = self.path_to_idx.get(rel_path)
+            if idx is not None and self.metadata[idx] is None:
+                self.metadata[idx] = metadata
+
+
+# Module-level cache of file metadata. A new monitor builds a fresh index and rebinds this name,
+# so callers that grabbed the old one keep a consistent snapshot.
+file_index = FileIndex()
+
+
+def _load_metadata(real_path: str, stat=None) -> Optional[Dict[str, Any]]:
+    """Returns metadata for an image, from the persistent cache when still fresh; None if the file is gone."""
+    if stat is None:
+        try:
+            stat = os.stat(real_path)
+        except OSError:
+            return None
+    cache = get_metadata_cache()
+    if cache is not None:
+        try:
+            cached = cache.get(real_path, stat.st_mtime, stat.st_size)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            gallery_log(f"Gallery Node: Error reading metadata cache for {real_path}: {e}")
+    try:
+        _, _, metadata = buildMetadata_fast(real_path)
+    except Exception as e:
+        gallery_log(f"Gallery Node: Error building metadata for {real_path}: {e}")
+        return {}
+    if cache is not None:
+        try:
+            cache.put(real_path, stat.st_mtime, stat.st_size, metadata)
+        except Exception as e:
+            gallery_log(f"Gallery Node: Error writing metadata cache for {real_path}: {e}")
+    return metadata
+
+
+def _build_file_info(base_path: str, file_path: str, stat=None) -> FileInfo:
+    """Build file info for a single file; image metadata is left pending until get_metadata is called."""
+    if stat is None:
+        stat = os.stat(file_path)
+    timestamp = stat.st_mtime
+    rel_dir = os.path.relpath(os.path.dirname(file_path), base_path)
+    filename = os.path.basename(file_path)
     subfolder = rel_dir if rel_dir != "." else ""
     if subfolder:
         url_path = f"/static_gallery/{subfolder}/{filename}"
@@ -30,142 +155,452 @@ def _build_file_info(base_path: str, real_path: str) -> FileInfo:
         url_path = f"/static_gallery/{filename}"
     url_path = url_path.replace("\\", "/")
 
-    metadata = {}
-    if filename.lower().endswith((".png", ".jpg", ".jpeg", ".webp")):
-        try:
-            _, _, metadata = buildMetadata(real_path)
-        except Exception as e:
-            gallery_log(f"Gallery Node: Error building metadata for {real_path}: {e}")
-            metadata = {}
-
-    return {
+    is_image = os.path.splitext(filename)[1].lower() in IMAGE_EXTS
+    info = {
         "name": filename,
         "url": url_path,
         "timestamp": timestamp,
-        "date": date_str,
-        "metadata": metadata,
-        "type": "image" if filename.lower().endswith((".png", ".jpg", ".jpeg", ".webp")) else "media",
+        "date": format_timestamp(timestamp),
+        "metadata": {},
+        "type": "image" if is_image else "media",
     }
+    if is_image:
+        info["metadata"] = None
+        info["_meta_pending"] = True
+    return info
+
+
+def get_metadata(rel_path: str, stat=None):
+    """Returns metadata for an indexed file, extracting it on first access. None if not indexed or gone."""
+    index = file_index
+    indexed, metadata = index.get_metadata(rel_path)
+    if not indexed:
+        return None
+    if metadata is None:
+        # Extract outside the lock; the row may be replaced meanwhile, fill_metadata checks that
+        metadata = _load_metadata(os.path.join(index.base_path, rel_path), stat)
+        if metadata is not None:
+            index.fill_metadata(rel_path, metadata)
+    return metadata
+
+
+def _prepare_changes(changes) -> Dict[str, Any]:
+    """Returns a copy of a batch for clients with pending metadata filled in and bookkeeping keys dropped."""
+    folders = {}
+    for folder_key, files in changes["folders"].items():
+        client_files = {}
+        for filename, change in files.items():
+            client_change = {key: value for key, value in change.items() if not key.startswith("_")}
+            if change.get("_meta_pending"):
+                rel_path = change["url"][len("/static_gallery/"):]
+                stat = change.get("_stat")  # Recorded by the polling observer, saves a stat for the cache check
+                metadata = get_metadata(rel_path, stat)
+                if metadata is None:
+                    metadata = _load_metadata(os.path.join(file_index.base_path, rel_path), stat)
+                if metadata is None:
+                    continue  # Deleted since; the remove event follows
+                client_change["metadata"] = metadata
+            client_files[filename] = client_change
+        if client_files:
+            folders[folder_key] = client_files
+    return {"folders": folders}
+
+
+# Bounds for GalleryEventHandler.processed_events.
+MAX_PROCESSED_EVENTS = 4096
+PROCESSED_EVENTS_TTL_FACTOR = 10
+
+# How many times a batch that failed to send is put back before it is dropped.
+MAX_SEND_RETRIES = 3
+
+# Clients are sent to in groups of this size, yielding to the event loop in between.
+BROADCAST_GROUP_SIZE = 50
+
+
+def _dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj)
+
+
+async def _broadcast_batched(payload):
+    """Sends a pre-serialized message to every connected client without monopolizing the server's event loop."""
+    sockets = list(PromptServer.instance.sockets.values())
+    for start in range(0, len(sockets), BROADCAST_GROUP_SIZE):
+        for ws in sockets[start:start + BROADCAST_GROUP_SIZE]:
+            try:
+                await ws.send_str(payload)
+            except Exception as e:
+                gallery_log(f"FileSystemMonitor: Error sending to client: {e}")
+        await asyncio.sleep(0)
+
+
+def _broadcast(event, data):
+    """Schedules a batched broadcast on the server loop; returns its future, or None if sent synchronously."""
+    server = PromptServer.instance
+    if getattr(server, "loop", None) is None or not hasattr(server, "sockets"):
+        server.send_sync(event, data)
+        return None
+    # Serialize once here, on the calling thread, rather than once per client on the event loop.
+    payload = _dumps({"type": event, "data": data})
+    return asyncio.run_coroutine_threadsafe(_broadcast_batched(payload), server.loop)
 
 
-class GalleryEventHandler(PatternMatchingEventHandler):
+# Matches the files the gallery shows; one regex search per event instead of an fnmatch per pattern.
+GALLERY_FILE_RE = re.compile(r"\.(?:%s)$" % "|".join(sorted(ext[1:] for ext in GALLERY_EXTS)), re.IGNORECASE)
+
+
+class _StatRecorder:
+    """os.stat replacement for the polling observer that remembers gallery files' stats from the latest poll."""
+
+    def __init__(self, root):
+        self.root = root
+        self.results: Dict[str, os.stat_result] = {}
+
+    def __call__(self, path):
+        stat = os.stat(path)
+        if path == self.root:
+            self.results = {}  # Each snapshot stats the root first
+        elif GALLERY_FILE_RE.search(path):
+            self.results[path] = stat
+        return stat
+
+    def get(self, path):
+        """Returns and consumes the recorded stat for path, or None."""
+        return self.results.pop(path, None)
+
+    def forget(self, path):
+        self.results.pop(path, None)
+
+
+# Events that change what the gallery shows; 'closed' (after write) is handled like 'modified'.
+HANDLED_EVENT_TYPES = frozenset({'created', 'modified', 'closed', 'deleted', 'moved'})
+
+
+class GalleryEventHandler(FileSystemEventHandler):
     """Handles file system events, including symlinks, recursively."""
 
-    def __init__(self, base_path, patterns=None, ignore_patterns=None, ignore_directories=False, case_sensitive=True, debounce_interval=0.5):
-        super().__init__(patterns=patterns, ignore_patterns=ignore_patterns, ignore_directories=ignore_directories, case_sensitive=case_sensitive)
+    def __init__(self, base_path, debounce_interval=0.5, max_batch_delay=2.0, max_batch_size=100, stat_recorder=None):
+        super().__init__()
         self.base_path = os.path.realpath(base_path)  # Use realpath for base_path
+        self.watch_path = os.path.abspath(base_path)  # Event paths are under this; symlinked folders keep their alias
         self.root_name = os.path.basename(self.base_path)
+        self.stat_recorder = stat_recorder  # Set when a polling observer shares its stat results
         self.debounce_timer = None
         self.debounce_interval = debounce_interval
-        # Use a dictionary to track events, keyed by (event_type, real_path)
-        self.processed_events = {}
-        self.pending_changes = {"folders": {}}
+        # A burst of events is flushed at most max_batch_delay seconds after its first event,
+        # or as soon as the debounce timer fires once max_batch_size files are pending.
+        self.max_batch_delay = max_batch_delay
+        self.max_batch_size = max_batch_size
+        # Track recent events, keyed by (event_type, real_path), oldest first. Entries expire after
+        # a few debounce intervals and the dict never exceeds MAX_PROCESSED_EVENTS.
+        self.processed_events = OrderedDict()
+        self.processed_events_lock = threading.Lock()
+        # realpath of each parent directory seen in events, so a file event costs one dict lookup
+        # instead of an lstat per path component. Entries are dropped when the directory goes away.
+        self._dir_realpath_cache: Dict[str, str] = {}
+        # pending_changes, pending_count, batch_started and debounce_timer are guarded by pending_lock
+        self.pending_lock = threading.Lock()
+        self.pending_changes = self._new_pending_changes()
+        self.pending_count = 0
+        self.send_failures = 0
+        self.batch_started = None
 
-    def on_any_event(self, event):
-        """Handle file system events and update the file index."""
+    def dispatch(self, event):
+        """Filters events down to gallery files and hands them to on_any_event."""
         if event.is_directory:
+            if event.event_type in ('deleted', 'moved'):
+                self._forget_directory(event.src_path)
             return
+        if event.event_type not in HANDLED_EVENT_TYPES:
+            return  # opened / closed_no_write don't change the file
+        if GALLERY_FILE_RE.search(event.src_path) or (event.event_type == 'moved' and GALLERY_FILE_RE.search(event.dest_path)):
+            self.on_any_event(event)
 
-        if event.src_path.endswith(('.swp', '.tmp', '~')):
+    def on_any_event(self, event):
+        """Handle file system events and update the file index."""
+        if event.is_directory:
             return
 
-        real_path = os.path.realpath(event.src_path)
+        real_path = self._realpath(event.src_path)
 
-        event_key = (event.event_type, real_path)
-        current_time = time.time()
-        if event_key in self.processed_events:
-            last_processed_time = self.processed_events[event_key]
-            if current_time - last_processed_time < self.debounce_interval:
-                return
-        self.processed_events[event_key] = current_time
+        # 'closed' is keyed separately so the end of a save isn't deduped against its 'modified' events
+        if self._is_duplicate_event((event.event_type, real_path)):
+            return
 
-        rel_path = os.path.relpath(real_path, self.base_path).replace("\\", "/")
+        # Key files by their path under the watched root, like the scanner does, not by where symlinks point
+        rel_path = os.path.relpath(event.src_path, self.watch_path).replace("\\", "/")
         folder_part = os.path.dirname(rel_path)
-        folder_key = self.root_name if folder_part in ("", ".") else os.path.join(self.root_name, folder_part).replace("\\", "/")
+        folder_key = self.root_name if folder_part in ("", ".") else sys.intern(os.path.join(self.root_name, folder_part).replace("\\", "/"))
         filename = os.path.basename(rel_path)
 
+        if self.stat_recorder is not None and event.event_type in ('deleted', 'moved'):
+            self.stat_recorder.forget(event.src_path)
+
         if event.event_type == 'deleted':
-            file_index.pop(rel_path, None)
-            self.pending_changes["folders"].setdefault(folder_key, {})[filename] = {"action": "remove"}
+            file_index.remove(rel_path)
+            self._queue_change(folder_key, filename, {"action": "remove"})
         elif event.event_type == 'moved':
-            dest_real = os.path.realpath(event.dest_path)
-            dest_rel = os.path.relpath(dest_real, self.base_path).replace("\\", "/")
+            dest_real = self._realpath(event.dest_path)
+            dest_rel = os.path.relpath(event.dest_path, self.watch_path).replace("\\", "/")
             dest_folder_part = os.path.dirname(dest_rel)
-            dest_folder_key = self.root_name if dest_folder_part in ("", ".") else os.path.join(self.root_name, dest_folder_part).replace("\\", "/")
+            dest_folder_key = self.root_name if dest_folder_part in ("", ".") else sys.intern(os.path.join(self.root_name, dest_folder_part).replace("\\", "/"))
             dest_filename = os.path.basename(dest_rel)
 
-            file_index.pop(rel_path, None)
-            self.pending_changes["folders"].setdefault(folder_key, {})[filename] = {"action": "remove"}
+            if GALLERY_FILE_RE.search(event.src_path):  # Not for temp files renamed into place
+                file_index.remove(rel_path)
+                self._queue_change(folder_key, filename, {"action": "remove"})
 
-            try:
-                file_info = _build_file_info(self.base_path, dest_real)
-                file_index[dest_rel] = file_info
-                self.pending_changes["folders"].setdefault(dest_folder_key, {})[dest_filename] = {"action": "create", **file_info}
-            except Exception as e:
-                gallery_log(f"GalleryEventHandler: Error processing moved file {dest_real}: {e}")
+            if GALLERY_FILE_RE.search(event.dest_path):
+                try:
+                    stat = self._recorded_stat(event.dest_path)
+                    file_info = _build_file_info(self.watch_path, event.dest_path, stat=stat)
+                    change = {"action": "create", **file_info, "_stat": stat}
+                    if dest_rel in file_index:
+                        change["_replaces_existing"] = True
+                    file_index.add(dest_rel, file_info)
+                    self._queue_change(dest_folder_key, dest_filename, change)
+                except Exception as e:
+                    gallery_log(f"GalleryEventHandler: Error processing moved file {dest_real}: {e}")
         else:
             action = "create" if event.event_type == "created" else "update"
             try:
-                file_info = _build_file_info(self.base_path, real_path)
-                file_index[rel_path] = file_info
-                self.pending_changes["folders"].setdefault(folder_key, {})[filename] = {"action": action, **file_info}
+                stat = self._recorded_stat(event.src_path)
+                file_info = _build_file_info(self.watch_path, event.src_path, stat=stat)
+                change = {"action": action, **file_info, "_stat": stat}
+                if action == "create" and rel_path in file_index:
+                    change["_replaces_existing"] = True
+                file_index.add(rel_path, file_info)
+                self._queue_change(folder_key, filename, change)
             except Exception as e:
                 gallery_log(f"GalleryEventHandler: Error processing file {real_path}: {e}")
 
-        if event.event_type in ('created', 'deleted', 'modified', 'moved'):
+        if event.event_type in HANDLED_EVENT_TYPES:
             gallery_log(f"Watchdog detected {event.event_type}: {event.src_path} (Real path: {real_path}) - debouncing")
             self.debounce_event()
 
+
+    def _recorded_stat(self, path):
+        return self.stat_recorder.get(path) if self.stat_recorder is not None else None
+
+    def _realpath(self, path):
+        """os.path.realpath for a file, resolving only its parent directory (cached)."""
+        parent, name = os.path.split(path)
+        real_parent = self._dir_realpath_cache.get(parent)
+        if real_parent is None:
+            real_parent = self._dir_realpath_cache.setdefault(parent, os.path.realpath(parent))
+        return os.path.join(real_parent, name)
+
+    def _forget_directory(self, path):
+        prefix = os.path.join(path, "")
+        for cached in [d for d in self._dir_realpath_cache if d == path or d.startswith(prefix)]:
+            self._dir_realpath_cache.pop(cached, None)
+
+    def _is_duplicate_event(self, event_key):
+        """Returns True if the same event was processed within the debounce interval, else records it."""
+        current_time = time.time()
+        with self.processed_events_lock:
+            last_processed_time = self.processed_events.get(event_key)
+            if last_processed_time is not None and current_time - last_processed_time < self.debounce_interval:
+                return True
+            self.processed_events[event_key] = current_time
+            self.processed_events.move_to_end(event_key)
+            expiry = current_time - self.debounce_interval * PROCESSED_EVENTS_TTL_FACTOR
+            while self.processed_events:
+                oldest_time = next(iter(self.processed_events.values()))
+                if oldest_time >= expiry and len(self.processed_events) <= MAX_PROCESSED_EVENTS:
+                    break
+                self.processed_events.popitem(last=False)
+        return False
 
+    @staticmethod
+    def _new_pending_changes():
+        return {"folders": defaultdict(dict)}
+
+    def _queue_change(self, folder_key, filename, change):
+        """Merges a change into the pending batch so each file is sent once with its final state."""
+        with self.pending_lock:
+            self._merge_change(folder_key, filename, change)
+
+    def _merge_change(self, folder_key, filename, change):
+        """_queue_change without the lock; the caller holds pending_lock."""
+        pending_folders = self.pending_changes["folders"]
+        folder_changes = pending_folders[folder_key]
+        previous = folder_changes.get(filename)
+        if previous is None:
+            self.pending_count += 1
+        elif change["action"] == "remove":
+            if previous["action"] == "create" and not previous.get("_replaces_existing"):
+                # Created and deleted within one batch: clients never need to hear about it
+                del folder_changes[filename]
+                self.pending_count -= 1
+                if not folder_changes:
+                    del pending_folders[folder_key]
+                return
+        elif previous["action"] == "create":
+            # Clients ignore updates for files they haven't seen yet
+            change["action"] = "create"
+            if previous.get("_replaces_existing"):
+                change["_replaces_existing"] = True
+        elif previous["action"] in ("remove", "update") and change["action"] == "create":
+            # Clients still have the old file; a later remove must not cancel this create out
+            change["_replaces_existing"] = True
+        elif previous["action"] == "remove":
+            change["action"] = "create"
+            change["_replaces_existing"] = True
+        folder_changes[filename] = change
+
     def debounce_event(self):
-        """Debounces the file system event."""
-        if self.debounce_timer and self.debounce_timer.is_alive():
-            self.debounce_timer.cancel()
+        """Debounces the file system event, capping how long a burst can postpone the flush."""
+        with self.pending_lock:
+            now = time.monotonic()
+            if self.batch_started is None:
+                self.batch_started = now
+            waited = now - self.batch_started
+            timer_pending = self.debounce_timer is not None and self.debounce_timer.is_alive()
+            if timer_pending and (waited >= self.max_batch_delay or self.pending_count >= self.max_batch_size):
+                return  # Let the current timer flush the batch
 
-        self.debounce_timer = threading.Timer(self.debounce_interval, self.rescan_and_send_changes)
-        self.debounce_timer.start()
+            if timer_pending:
+                self.debounce_timer.cancel()
+            delay = min(self.debounce_interval, max(self.max_batch_delay - waited, 0.0))
+            self.debounce_timer = threading.Timer(delay, self.rescan_and_send_changes)
+            self.debounce_timer.start()
 
     def rescan_and_send_changes(self):
         """Send pending changes to clients without rescanning."""
-        if not self.pending_changes["folders"]:
-            self.debounce_timer = None
+        with self.pending_lock:
+            changes = self.pending_changes
+            self.pending_changes = self._new_pending_changes()
+            self.pending_count = 0
+            self.batch_started = None
+            # A newer timer may already be armed (flush forced by max_batch_size); keep the reference
+            # so debounce_event can still cancel it.
+            if self.debounce_timer is threading.current_thread():
+                self.debounce_timer = None
+        if not changes["folders"]:
             return
 
         try:
             from .server import sanitize_json_data
-            PromptServer.instance.send_sync("Gallery.file_change", sanitize_json_data(self.pending_changes))
+            future = _broadcast("Gallery.file_change", sanitize_json_data(_prepare_changes(changes)))
         except Exception as e:
-            gallery_log(f"FileSystemMonitor: Error sending changes: {e}")
-        finally:
-            self.pending_changes = {"folders": {}}
-            self.debounce_timer = None
+            self._send_failed(changes, e)
+            return
+        if future is None:
+            self.send_failures = 0
+        else:
+            # The broadcast runs on the server loop; failures there only show up on the future.
+            future.add_done_callback(lambda f: self._broadcast_done(changes, f))
+
+    def _broadcast_done(self, changes, future):
+        if future.cancelled():
+            self._send_failed(changes, "broadcast cancelled")
+        elif future.exception() is not None:
+            self._send_failed(changes, future.exception())
+        else:
+            self.send_failures = 0
+
+    def _send_failed(self, changes, error):
+        """Requeues a batch that could not be sent, giving up after MAX_SEND_RETRIES consecutive failures."""
+        gallery_log(f"FileSystemMonitor: Error sending changes: {error}")
+        self.send_failures += 1
+        if self.send_failures > MAX_SEND_RETRIES:
+            gallery_log(f"FileSystemMonitor: Dropping changes after {MAX_SEND_RETRIES} failed retries.")
+            self.send_failures = 0
+            return
+        self._requeue_changes(changes)
+        self.debounce_event()
+
+    def _requeue_changes(self, changes):
+        """Puts an unsent batch back, merging the changes queued since the swap on top of it."""
+        with self.pending_lock:
+            newer = self.pending_changes
+            self.pending_changes = changes
+            self.pending_count = sum(len(files) for files in changes["folders"].values())
+            for folder_key, files in list(newer["folders"].items()):
+                for filename, change in files.items():
+                    self._merge_change(folder_key, filename, change)
 
 
 
+# Filesystems where inotify/FSEvents don't see changes made by other hosts.
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "afs", "ncpfs", "glusterfs", "ceph", "fuse.rclone"}
+
+
+def _is_network_filesystem(path):
+    """Returns True if path lives on a network mount (Linux only, via /proc/mounts)."""
+    try:
+        with open("/proc/mounts") as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+    real_path = os.path.realpath(path)
+    best_mount, best_type = "", ""
+    for mount_point, fs_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        if (real_path == mount_point or real_path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > len(best_mount):
+            best_mount, best_type = mount_point, fs_type
+    return best_type in NETWORK_FILESYSTEMS
+
+
+def _has_directory_symlinks(path):
+    """Returns True if any non-hidden folder below path is a symlink to a directory."""
+    directories = [path]
+    while directories:
+        try:
+            with os.scandir(directories.pop()) as it:
+                for entry in it:
+                    if entry.name.startswith(".") or not entry.is_dir():
+                        continue
+                    if entry.is_symlink():
+                        return True
+                    directories.append(entry.path)
+        except OSError:
+            continue
+    return False
+
+
 class FileSystemMonitor:
     """Monitors the output directory, including symlinks, recursively."""
 
     def __init__(self, base_path, interval=1.0, use_polling_observer=False):
         self.base_path = base_path
         self.interval = interval
+        if not use_polling_observer and _is_network_filesystem(base_path):
+            gallery_log(f"FileSystemMonitor: {base_path} is on a network filesystem, using polling observer.")
+            use_polling_observer = True
+        if not use_polling_observer and _has_directory_symlinks(base_path):
+            # inotify and friends don't descend into symlinked folders, but the snapshot walk does.
+            gallery_log(f"FileSystemMonitor: {base_path} contains symlinked folders, using polling observer.")
+            use_polling_observer = True
         self.use_polling_observer = use_polling_observer
         if use_polling_observer:
+            stat_recorder = _StatRecorder(base_path)
+            self.observer = PollingObserverVFS(stat=stat_recorder, listdir=os.scandir, polling_interval=interval)
+        else:
+            stat_recorder = None
             self.observer = Observer()
-        else:
-            self.observer = PollingObserver()
-        self.event_handler = GalleryEventHandler(base_path=base_path, patterns=["*.png", "*.jpg", "*.jpeg", "*.webp", "*.mp4", "*.gif", "*.webm"], debounce_interval=0.5)
+        self.event_handler = GalleryEventHandler(base_path=base_path, debounce_interval=0.5, stat_recorder=stat_recorder)
+        # Metadata is extracted on demand via get_metadata, so the initial index is just a directory walk.
+        # The index is built off to the side and published with a single (atomic) rebind.
+        new_index = FileIndex(os.path.realpath(base_path))
         folder_name = os.path.basename(base_path)
-        folders_data, _ = _scan_for_images(base_path, folder_name, True)
+        folders_data, _ = _scan_for_images(base_path, folder_name, True, with_metadata=False)
         for folder, files in folders_data.items():
             rel_dir = os.path.relpath(folder, folder_name)
             for filename, info in files.items():
                 rel_path = os.path.join(rel_dir, filename) if rel_dir != '.' else filename
-                file_index[rel_path.replace("\\", "/")] = info
+                new_index.add(rel_path.replace("\\", "/"), info)
+        global file_index
+        file_index = new_index
         self.thread = None
+        self._stop_event = threading.Event()
 
     def start_monitoring(self):
         """Starts the Watchdog observer."""
         if self.thread is None or not self.thread.is_alive():
+            self._stop_event.clear()
             self.thread = threading.Thread(target=self._start_observer_thread, daemon=True)
             self.thread.start()
             gallery_log("FileSystemMonitor: Watchdog monitoring thread started.")
@@ -177,14 +612,14 @@ class FileSystemMonitor:
         self.observer.follow_directory_symlinks = True  # Ensure symlinks are followed
         self.observer.start()
         try:
-            while True:
-                time.sleep(0.1)
+            self._stop_event.wait()  # Sleeps without waking until stop_monitoring
         except KeyboardInterrupt:
             self.stop_monitoring()
 
     def stop_monitoring(self):
         """Stops the Watchdog observer."""
         if self.thread and self.thread.is_alive():
+            self._stop_event.set()
             self.observer.stop()
             if self.observer.is_alive():
                 self.observer.join()
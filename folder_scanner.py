@@ -1,71 +1,192 @@
 # folder_scanner.py
+import multiprocessing
 import os
-from datetime import datetime
-from .metadata_extractor import buildMetadata  # Import metadata extractor
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import time
+from .metadata_extractor import buildMetadata_fast  # Import metadata extractor
+from .metadata_cache import get_metadata_cache
+
+IMAGE_EXTS = frozenset({".png", ".jpg", ".jpeg", ".webp"})
+MEDIA_EXTS = frozenset({".mp4", ".gif", ".webm"})  # Videos and GIFs, no metadata extraction
+GALLERY_EXTS = IMAGE_EXTS | MEDIA_EXTS
+
+# Below this many images the cost of spinning up workers outweighs the gain.
+PARALLEL_METADATA_THRESHOLD = 64
+# Header parsing is mostly file IO, so threads overlap it well. The process pool is opt-in: forking
+# the multithreaded ComfyUI server (event loop, prompt worker, CUDA threads) can deadlock the child.
+USE_PROCESS_POOL = False
+METADATA_THREADS = 16
+
+
+def format_timestamp(timestamp):
+    """Formats an mtime the way the gallery displays it (local time)."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+def _extract_metadata(path):
+    """Worker entry point: returns only the metadata dict (PIL images don't cross process boundaries), or None on error."""
+    try:
+        _, _, metadata = buildMetadata_fast(path)
+        return metadata
+    except Exception as e:
+        print(f"Gallery Node: Error building metadata for {path}: {e}")
+        return None
+
+
+def _fork_context():
+    """Returns a fork multiprocessing context if fork is the start method in effect, else None.
+
+    Under spawn/forkserver every worker would re-import ComfyUI, so threads are used instead.
+    Reads the start method without fixing it, so ComfyUI can still call set_start_method later.
+    """
+    method = multiprocessing.get_start_method(allow_none=True) or multiprocessing.get_all_start_methods()[0]
+    return multiprocessing.get_context("fork") if method == "fork" else None
+
+
+def _extract_metadata_batch(paths):
+    """Builds metadata for all paths, using a process or thread pool for large batches."""
+    if len(paths) < PARALLEL_METADATA_THRESHOLD:
+        return [_extract_metadata(path) for path in paths]
+    mp_context = _fork_context() if USE_PROCESS_POOL else None
+    if mp_context is not None:
+        try:
+            with ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=mp_context) as executor:
+                return list(executor.map(_extract_metadata, paths, chunksize=32))
+        except Exception as e:
+            print(f"Gallery Node: Process pool metadata extraction failed, falling back to threads: {e}")
+    with ThreadPoolExecutor(max_workers=METADATA_THREADS) as executor:
+        return list(executor.map(_extract_metadata, paths))
+
 
-def _scan_for_images(full_base_path, base_path, include_subfolders):
-    """Scans directories for images, videos, and GIFs and their metadata."""
+def _scan_for_images(full_base_path, base_path, include_subfolders, with_metadata=True):
+    """Scans directories for images, videos, and GIFs and their metadata.
+
+    With with_metadata=False images get "metadata": None and a "_meta_pending" marker instead.
+    """
     folders_data = {}
     current_files = set()
     changed = False
+    pending_folders = []  # (folder_key, [(filename, info, is_image, path, cache_key, size)]) in scan order
 
-    def scan_directory(dir_path, relative_path=""):
-        """Recursively scans a directory for image, video, and GIF files."""
-        nonlocal changed
-        folder_content = {}  # Dictionary to hold files for the current folder
+    # Iterative walk: (dir_path, relative_path, ancestors) with relative_path using os.sep like os.path.join would.
+    # Symlinked directories are followed; a folder whose real path is one of its ancestors' is a cycle.
+    directories = deque([(full_base_path, "", frozenset())])
+    while directories:
+        dir_path, relative_path, ancestors = directories.popleft()
+        folder_entries = []
         try:
-            file_entries = []
-
-            for entry in os.scandir(dir_path):
-                if entry.is_dir():
-                    if include_subfolders and not entry.name.startswith("."):
-                        next_relative_path = os.path.join(relative_path, entry.name)
-                        scan_directory(entry.path, next_relative_path)
-                elif entry.is_file():
-                    file_entries.append(entry)
-                    current_files.add(entry.path)
+            real_dir_path = os.path.realpath(dir_path)
+            if real_dir_path in ancestors:
+                continue
+            ancestors = ancestors | {real_dir_path}
+            url_prefix = f"/static_gallery/{relative_path.replace(os.sep, '/')}/" if relative_path else "/static_gallery/"
 
-            for entry in file_entries:
-                name = entry.name
-                if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.mp4', '.gif', '.webm')): # ADDED: .mp4 and .gif extensions
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    name = entry.name
+                    if entry.is_dir():
+                        if include_subfolders and not name.startswith("."):
+                            directories.append((entry.path, f"{relative_path}{os.sep}{name}" if relative_path else name, ancestors))
+                        continue
+                    ext = os.path.splitext(name)[1].lower()
+                    if ext not in GALLERY_EXTS or not entry.is_file():
+                        continue
+                    current_files.add(entry.path)
                     try:
-                        timestamp = entry.stat().st_mtime
-                        date_str = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
-                        rel_path = os.path.relpath(dir_path, full_base_path)
-                        filename = name
-                        subfolder = rel_path if rel_path != "." else ""
-                        if len(subfolder) > 0:
-                          url_path = f"/static_gallery/{subfolder}/{filename}"
-                        else:
-                          url_path = f"/static_gallery/{filename}"
-                        url_path = url_path.replace("\\", "/")
-
-                        metadata = {} # Videos and GIFs will have empty metadata for now
-                        if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')): # Only build metadata for images
-                            # Extract metadata here
-                            try:
-                                _, _, metadata = buildMetadata(entry.path)
-                            except Exception as e:
-                                print(f"Gallery Node: Error building metadata for {entry.path}: {e}")
-                                metadata = {}
-
-                        folder_content[filename] = { # Store file info in folder_content dict
+                        stat = entry.stat()
+                        timestamp = stat.st_mtime
+                        is_image = ext in IMAGE_EXTS
+                        info = {
                             "name": name,
-                            "url": url_path,
+                            "url": url_prefix + name,
                             "timestamp": timestamp,
-                            "date": date_str,
-                            "metadata": metadata,
-                            "type": "image" if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')) else "media" # Added type to distinguish images and media
+                            "date": format_timestamp(timestamp),
+                            "metadata": {}, # Videos and GIFs will have empty metadata for now
+                            "type": "image" if is_image else "media" # Added type to distinguish images and media
                         }
+                        cache_key = os.path.join(real_dir_path, name)
+                        folder_entries.append((name, info, is_image, entry.path, cache_key, stat.st_size))
                     except Exception as e:
                         print(f"Gallery Node: Error processing file {entry.path}: {e}")
 
             folder_key = os.path.join(base_path, relative_path) if relative_path else base_path
-            if folder_content: # Only add folder if it has content
-                folders_data[folder_key] = folder_content
+            if folder_entries: # Only add folder if it has content
+                pending_folders.append((folder_key, folder_entries))
 
         except Exception as e:
             print(f"Gallery Node: Error scanning directory {dir_path}: {e}")
-
-    scan_directory(full_base_path, "")
+
+    if not with_metadata:
+        for folder_key, folder_entries in pending_folders:
+            for _, info, is_image, *_ in folder_entries:
+                if is_image:
+                    info["metadata"] = None
+                    info["_meta_pending"] = True
+            folders_data[folder_key] = {filename: info for filename, info, *_ in folder_entries}
+        return folders_data, changed
+
+    # Only images go through metadata extraction; videos and GIFs skip the pool.
+    # Unchanged images are served from the persistent cache, keyed by real path and (mtime, size).
+    cache = get_metadata_cache()
+    cached_rows = {}
+    real_base_path = os.path.realpath(full_base_path)
+    if cache is not None:
+        try:
+            cached_rows = cache.get_under(real_base_path)
+        except Exception as e:
+            print(f"Gallery Node: Error reading metadata cache: {e}")
+            cache = None
+
+    seen_keys = set()
+    miss_infos = []
+    miss_paths = []
+    miss_rows = []
+    for _, folder_entries in pending_folders:
+        for _, info, is_image, path, cache_key, size in folder_entries:
+            if not is_image:
+                continue
+            seen_keys.add(cache_key)
+            metadata = None
+            if cache is not None:
+                row = cached_rows.get(cache_key)
+                if row is not None:
+                    if row[0] == info["timestamp"] and row[1] == size:
+                        try:
+                            metadata = pickle.loads(row[2])
+                        except Exception:
+                            metadata = None
+                elif not cache_key.startswith(os.path.join(real_base_path, "")):
+                    # Symlinked subfolders resolve outside the bulk-loaded range.
+                    try:
+                        metadata = cache.get(cache_key, info["timestamp"], size)
+                    except Exception as e:
+                        print(f"Gallery Node: Error reading metadata cache for {path}: {e}")
+            if metadata is not None:
+                info["metadata"] = metadata
+            else:
+                miss_infos.append(info)
+                miss_paths.append(path)
+                miss_rows.append((cache_key, info["timestamp"], size))
+
+    new_rows = []
+    for info, row, metadata in zip(miss_infos, miss_rows, _extract_metadata_batch(miss_paths)):
+        if metadata is None:
+            info["metadata"] = {}  # Don't cache failures, the file may still be being written
+        else:
+            info["metadata"] = metadata
+            new_rows.append((*row, metadata))
+
+    if cache is not None:
+        try:
+            cache.put_many(new_rows)
+            if include_subfolders:
+                cache.prune(real_base_path, seen_keys)
+        except Exception as e:
+            print(f"Gallery Node: Error updating metadata cache: {e}")
+
+    for folder_key, folder_entries in pending_folders:
+        folders_data[folder_key] = {filename: info for filename, info, *_ in folder_entries}
+
     return folders_data, changed
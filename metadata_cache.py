@@ -0,0 +1,88 @@
+# metadata_cache.py
+import os
+import pickle
+import sqlite3
+import threading
+from .gallery_config import gallery_log
+
+# Persistent cache of buildMetadata results, keyed by real path and invalidated by (mtime, size).
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "comfyui-gallery")
+CACHE_PATH = os.path.join(CACHE_DIR, "meta.db")
+
+
+class MetadataCache:
+    """SQLite-backed metadata cache shared by the scanner and the file monitor."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, mtime REAL, size INTEGER, blob BLOB)")
+        self.conn.commit()
+
+    @staticmethod
+    def _prefix_bounds(root):
+        prefix = os.path.join(root, "")
+        return prefix, prefix + "\U0010ffff"
+
+    def get(self, key, mtime, size):
+        """Returns the cached metadata for key, or None if missing or stale."""
+        with self.lock:
+            row = self.conn.execute("SELECT mtime, size, blob FROM metadata WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] != mtime or row[1] != size:
+            return None
+        try:
+            return pickle.loads(row[2])
+        except Exception:
+            return None
+
+    def get_under(self, root):
+        """Returns {key: (mtime, size, blob)} for every cached file below root."""
+        low, high = self._prefix_bounds(root)
+        with self.lock:
+            rows = self.conn.execute("SELECT key, mtime, size, blob FROM metadata WHERE key >= ? AND key < ?", (low, high)).fetchall()
+        return {key: (mtime, size, blob) for key, mtime, size, blob in rows}
+
+    def put(self, key, mtime, size, metadata):
+        self.put_many([(key, mtime, size, metadata)])
+
+    def put_many(self, rows):
+        """Stores (key, mtime, size, metadata) rows in a single transaction."""
+        if not rows:
+            return
+        data = [(key, mtime, size, pickle.dumps(metadata, protocol=pickle.HIGHEST_PROTOCOL)) for key, mtime, size, metadata in rows]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO metadata (key, mtime, size, blob) VALUES (?, ?, ?, ?)", data)
+
+    def prune(self, root, seen_keys):
+        """Evicts rows below root whose files were not seen by the latest scan."""
+        low, high = self._prefix_bounds(root)
+        with self.lock:
+            keys = self.conn.execute("SELECT key FROM metadata WHERE key >= ? AND key < ?", (low, high)).fetchall()
+        stale = [(key,) for key, in keys if key not in seen_keys]
+        if not stale:
+            return
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM metadata WHERE key = ?", stale)
+
+
+_cache = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+
+def get_metadata_cache():
+    """Returns the shared MetadataCache, or None if the cache database is unavailable."""
+    global _cache, _cache_failed
+    if _cache is None and not _cache_failed:
+        with _cache_lock:
+            if _cache is None and not _cache_failed:
+                try:
+                    _cache = MetadataCache(CACHE_PATH)
+                except Exception as e:
+                    _cache_failed = True
+                    gallery_log(f"Gallery Node: Metadata cache disabled ({CACHE_PATH}): {e}")
+    return _cache
@@ -1,5 +1,7 @@
 import os
 import json
+import struct
+import zlib
 from datetime import datetime
 from pathlib import Path
 from PIL import Image, ImageOps
@@ -20,6 +22,82 @@ def get_size(file_path):
         return f"{file_size_bytes / (1024 * 1024):.2f} MB"
 
 
+def _apply_png_info(metadataFromImg, metadata):
+    """Copies PNG text chunks into metadata, returns the parsed ComfyUI prompt (or {})."""
+    prompt = {}
+    # for all metadataFromImg convert to string (but not for workflow and prompt!)
+    for k, v in metadataFromImg.items():
+        # from ComfyUI
+        if k == "workflow":
+            if isinstance(v, str): # Check if v is a string before attempting json.loads
+                try:
+                    metadata["workflow"] = json.loads(v)
+                except json.JSONDecodeError as e:
+                    print(f"Warning: Error parsing metadataFromImg 'workflow' as JSON, keeping as string: {e}")
+                    metadata["workflow"] = v # Keep as string if parsing fails
+            else:
+                metadata["workflow"] = v # If not a string, keep as is (might already be parsed)
+
+        # from ComfyUI
+        elif k == "prompt":
+            if isinstance(v, str): # Check if v is a string before attempting json.loads
+                try:
+                    metadata["prompt"] = json.loads(v)
+                    prompt = metadata["prompt"] # extract prompt to use on metadata
+                except json.JSONDecodeError as e:
+                    print(f"Warning: Error parsing metadataFromImg 'prompt' as JSON, keeping as string: {e}")
+                    metadata["prompt"] = v # Keep as string if parsing fails
+            else:
+                metadata["prompt"] = v # If not a string, keep as is (might already be parsed)
+
+        else:
+            if isinstance(v, str): # Check if v is a string before attempting json.loads
+                try:
+                    metadata[str(k)] = json.loads(v)
+                except json.JSONDecodeError as e:
+                    # print(f"Debug: Error parsing {k} as JSON, trying as string: {e}")
+                    metadata[str(k)] = v # Keep as string if parsing fails
+            else:
+                metadata[str(k)] = v # If not a string, keep as is
+
+    return prompt
+
+
+def _apply_exif(exif, metadata):
+    """Copies EXIF tags and IFDs into metadata as strings."""
+    for k, v in exif.items():
+        tag = TAGS.get(k, k)
+        if v is not None:
+            try:
+                metadata[str(tag)] = str(v)
+            except Exception as e:
+                print(f"Warning: Error converting EXIF tag {tag} to string: {e}")
+                metadata[str(tag)] = "Error decoding value" # Handle encoding errors
+
+    for ifd_id in IFD:
+        try:
+            if ifd_id == IFD.GPSInfo:
+                resolve = GPSTAGS
+            else:
+                resolve = TAGS
+
+            ifd = exif.get_ifd(ifd_id)
+            ifd_name = str(ifd_id.name)
+            metadata[ifd_name] = {}
+
+            for k, v in ifd.items():
+                tag = resolve.get(k, k)
+                try:
+                    metadata[ifd_name][str(tag)] = str(v)
+                except Exception as e:
+                    print(f"Warning: Error converting EXIF IFD tag {tag} to string: {e}")
+                    metadata[ifd_name][str(tag)] = "Error decoding value" # Handle encoding errors
+
+
+        except KeyError:
+            pass
+
+
 def buildMetadata(image_path):
     if not Path(image_path).is_file():
         raise FileNotFoundError(f"File not found: {image_path}")
@@ -37,80 +115,155 @@ def buildMetadata(image_path):
 
     # only for png files
     if isinstance(img, PngImageFile):
-        metadataFromImg = img.info
-
-        # for all metadataFromImg convert to string (but not for workflow and prompt!)
-        for k, v in metadataFromImg.items():
-            # from ComfyUI
-            if k == "workflow":
-                if isinstance(v, str): # Check if v is a string before attempting json.loads
-                    try:
-                        metadata["workflow"] = json.loads(v)
-                    except json.JSONDecodeError as e:
-                        print(f"Warning: Error parsing metadataFromImg 'workflow' as JSON, keeping as string: {e}")
-                        metadata["workflow"] = v # Keep as string if parsing fails
-                else:
-                    metadata["workflow"] = v # If not a string, keep as is (might already be parsed)
-
-            # from ComfyUI
-            elif k == "prompt":
-                if isinstance(v, str): # Check if v is a string before attempting json.loads
-                    try:
-                        metadata["prompt"] = json.loads(v)
-                        prompt = metadata["prompt"] # extract prompt to use on metadata
-                    except json.JSONDecodeError as e:
-                        print(f"Warning: Error parsing metadataFromImg 'prompt' as JSON, keeping as string: {e}")
-                        metadata["prompt"] = v # Keep as string if parsing fails
-                else:
-                    metadata["prompt"] = v # If not a string, keep as is (might already be parsed)
-
-            else:
-                if isinstance(v, str): # Check if v is a string before attempting json.loads
-                    try:
-                        metadata[str(k)] = json.loads(v)
-                    except json.JSONDecodeError as e:
-                        # print(f"Debug: Error parsing {k} as JSON, trying as string: {e}")
-                        metadata[str(k)] = v # Keep as string if parsing fails
-                else:
-                    metadata[str(k)] = v # If not a string, keep as is
+        prompt = _apply_png_info(img.info, metadata)
 
     if isinstance(img, JpegImageFile):
-        exif = img.getexif()
-
-        for k, v in exif.items():
-            tag = TAGS.get(k, k)
-            if v is not None:
-                try:
-                    metadata[str(tag)] = str(v)
-                except Exception as e:
-                    print(f"Warning: Error converting EXIF tag {tag} to string: {e}")
-                    metadata[str(tag)] = "Error decoding value" # Handle encoding errors
-
-        for ifd_id in IFD:
-            try:
-                if ifd_id == IFD.GPSInfo:
-                    resolve = GPSTAGS
-                else:
-                    resolve = TAGS
-
-                ifd = exif.get_ifd(ifd_id)
-                ifd_name = str(ifd_id.name)
-                metadata[ifd_name] = {}
+        _apply_exif(img.getexif(), metadata)
 
-                for k, v in ifd.items():
-                    tag = resolve.get(k, k)
-                    try:
-                        metadata[ifd_name][str(tag)] = str(v)
-                    except Exception as e:
-                        print(f"Warning: Error converting EXIF IFD tag {tag} to string: {e}")
-                        metadata[ifd_name][str(tag)] = "Error decoding value" # Handle encoding errors
+    return img, prompt, metadata
 
 
-            except KeyError:
-                pass
+# Fast path: parse only the header bytes where PNG text chunks / JPEG APP1 live instead of going through PIL.
+FAST_READ_SIZES = (64 * 1024, 256 * 1024)
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Chunks that PIL would not turn into img.info entries; anything else sends us to the PIL path.
+PNG_PLAIN_CHUNKS = {b"IHDR", b"PLTE", b"tEXt", b"zTXt", b"iTXt"}
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
 
 
-    return img, prompt, metadata
+class _NeedMoreData(Exception):
+    """The header didn't fit in the bytes read so far."""
+
+
+class _Unsupported(Exception):
+    """The header uses features only the PIL path handles."""
+
+
+def _parse_png_header(buf):
+    """Returns ((width, height), info) from the chunks before IDAT, mirroring PIL's text chunk decoding."""
+    size = None
+    info = {}
+    offset = len(PNG_SIGNATURE)
+    while True:
+        if offset + 8 > len(buf):
+            raise _NeedMoreData()
+        length, chunk_type = struct.unpack(">I4s", buf[offset:offset + 8])
+        if chunk_type in (b"IDAT", b"IEND"):
+            break
+        if chunk_type not in PNG_PLAIN_CHUNKS:
+            raise _Unsupported()
+        data_end = offset + 8 + length
+        if data_end + 4 > len(buf):
+            raise _NeedMoreData()
+        data = buf[offset + 8:data_end]
+        if chunk_type == b"IHDR":
+            size = struct.unpack(">II", data[:8])
+        elif chunk_type == b"tEXt":
+            k, v = data.split(b"\0", 1)
+            info[k.decode("latin-1")] = v.decode("latin-1", "replace")
+        elif chunk_type == b"zTXt":
+            k, v = data.split(b"\0", 1)
+            if v[0] != 0:
+                raise _Unsupported()
+            info[k.decode("latin-1")] = zlib.decompress(v[1:]).decode("latin-1", "replace")
+        elif chunk_type == b"iTXt":
+            k, r = data.split(b"\0", 1)
+            compressed, method, r = r[0], r[1], r[2:]
+            _, _, v = r.split(b"\0", 2)
+            if compressed:
+                if method != 0:
+                    raise _Unsupported()
+                v = zlib.decompress(v)
+            info[k.decode("latin-1")] = v.decode("utf-8")
+        offset = data_end + 4
+    if size is None:
+        raise _Unsupported()
+    return size, info
+
+
+def _parse_jpeg_header(buf):
+    """Returns ((width, height), exif_bytes or None) from the segments before the scan data."""
+    exif_bytes = None
+    offset = 2
+    while True:
+        if offset + 4 > len(buf):
+            raise _NeedMoreData()
+        if buf[offset] != 0xFF:
+            raise _Unsupported()
+        marker = buf[offset + 1]
+        if marker == 0xFF:  # fill byte
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # standalone markers
+            offset += 2
+            continue
+        if marker == 0xDA:  # start of scan without a frame header
+            raise _Unsupported()
+        length = struct.unpack(">H", buf[offset + 2:offset + 4])[0]
+        segment_end = offset + 2 + length
+        if segment_end > len(buf):
+            raise _NeedMoreData()
+        data = buf[offset + 4:segment_end]
+        if marker == 0xE1 and exif_bytes is None and data.startswith(b"Exif\0\0"):
+            exif_bytes = data
+        elif marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[1:5])
+            return (width, height), exif_bytes
+        offset = segment_end
+
+
+def buildMetadata_fast(image_path):
+    """Same result as buildMetadata, but reads only the file header for PNG and JPEG.
+
+    Returns (None, prompt, metadata); other formats and unusual headers fall back to buildMetadata.
+    """
+    if not Path(image_path).is_file():
+        raise FileNotFoundError(f"File not found: {image_path}")
+
+    try:
+        with open(image_path, "rb") as f:
+            for read_size in FAST_READ_SIZES:
+                f.seek(0)
+                buf = f.read(read_size)
+                try:
+                    if buf.startswith(PNG_SIGNATURE):
+                        (width, height), info = _parse_png_header(buf)
+                        exif = None
+                    elif buf.startswith(b"\xff\xd8"):
+                        (width, height), exif_bytes = _parse_jpeg_header(buf)
+                        info = None
+                        exif = Image.Exif()
+                        if exif_bytes is not None:
+                            exif.load(exif_bytes)
+                    else:
+                        raise _Unsupported()
+                    break
+                except _NeedMoreData:
+                    if len(buf) < read_size:  # truncated file
+                        raise _Unsupported()
+            else:
+                raise _Unsupported()
+    except (_Unsupported, ValueError, IndexError, struct.error, zlib.error, UnicodeDecodeError):
+        _, prompt, metadata = buildMetadata(image_path)
+        return None, prompt, metadata
+
+    metadata = {}
+    prompt = {}
+
+    metadata["fileinfo"] = {
+        "filename": Path(image_path).as_posix(),
+        "resolution": f"{width}x{height}",
+        "date": str(datetime.fromtimestamp(os.path.getmtime(image_path))),
+        "size": str(get_size(image_path)),
+    }
+
+    if info is not None:
+        prompt = _apply_png_info(info, metadata)
+
+    if exif is not None:
+        _apply_exif(exif, metadata)
+
+    return None, prompt, metadata
 
 
 def buildPreviewText(metadata):
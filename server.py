@@ -12,7 +12,7 @@ import queue
 import asyncio
 import shutil
 
-from .folder_monitor import FileSystemMonitor
+from .folder_monitor import FileSystemMonitor, get_metadata
 from .folder_scanner import _scan_for_images
 from .gallery_config import disable_logs, gallery_log
 
@@ -102,6 +102,23 @@ async def get_gallery_images(request):
     result = result_queue.get() # BLOCKING call
     return on_scan_complete(result)
 
+
+
+@PromptServer.instance.routes.get("/Gallery/metadata")
+async def get_gallery_metadata(request):
+    """Endpoint to get the metadata of a single monitored file, accepts relative_path."""
+    relative_path = request.rel_url.query.get("relative_path")
+    if not relative_path:
+        return web.Response(status=400, text="relative_path is required")
+    try:
+        # Metadata for files outside the viewport is only extracted when asked for.
+        metadata = await asyncio.get_running_loop().run_in_executor(None, get_metadata, relative_path.replace("\\", "/"))
+        if metadata is None:
+            return web.Response(status=404, text=f"File not indexed: {relative_path}")
+        return web.Response(text=json.dumps(sanitize_json_data(metadata)), content_type="application/json")
+    except Exception as e:
+        gallery_log(f"Error in /Gallery/metadata: {e}")
+        return web.Response(status=500, text=str(e))
 
 
 @PromptServer.instance.routes.post("/Gallery/monitor/start")
@@ -132,7 +149,7 @@ async def start_gallery_monitor(request):
         else:
             gallery_log("Error: Placeholder static route not found!")
             return web.Response(status=500, text="Placeholder route not found.")
-        monitor = FileSystemMonitor(full_monitor_path, use_polling_observer)
+        monitor = FileSystemMonitor(full_monitor_path, use_polling_observer=use_polling_observer)
         monitor.start_monitoring()
         return web.Response(text="Gallery monitor started", content_type="text/plain")
     except Exception as e: